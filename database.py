@@ -1,12 +1,52 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, async_scoped_session
+from sqlalchemy.orm import declarative_base
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 import os
 from dotenv import load_dotenv
 
 load_dotenv()
 
 DB_URL = os.getenv('DATABASE_URL')
+# Always connect through asyncpg, whatever driver DATABASE_URL names. asyncpg
+# doesn't understand libpq's query parameters: sslmode becomes its ssl argument
+# (which takes the same mode names) and channel_binding is dropped.
+_url = make_url(DB_URL)
+_sslmode = _url.query.get('sslmode')
+ASYNC_DB_URL = _url.set(drivername='postgresql+asyncpg').difference_update_query(
+    ['sslmode', 'channel_binding']
+)
 
-engine = create_engine(DB_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Each uvicorn worker gets its own pool, so keep
+# workers * (DB_POOL_SIZE + DB_MAX_OVERFLOW) below Postgres max_connections
+engine = create_async_engine(
+    ASYNC_DB_URL,
+    pool_size=int(os.getenv('DB_POOL_SIZE', 20)),
+    max_overflow=int(os.getenv('DB_MAX_OVERFLOW', 10)),
+    pool_timeout=30,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    connect_args={'ssl': _sslmode} if _sslmode else {},
+)
+SessionLocal = async_sessionmaker(bind=engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
+
+# One session per request scope, opened by session_scope()
+_session_scope = ContextVar('session_scope')
+SessionScoped = async_scoped_session(SessionLocal, scopefunc=_session_scope.get)
+
+
+@asynccontextmanager
+async def session_scope():
+    """
+    Open a session scope: SessionScoped() returns the same session anywhere
+    inside it, including tasks spawned from it, and the session is closed on exit.
+    """
+
+    token = _session_scope.set(object())
+    try:
+        yield
+    finally:
+        await SessionScoped.remove()
+        _session_scope.reset(token)
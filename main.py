@@ -1,13 +1,73 @@
-from fastapi import FastAPI, Depends, Query
+import asyncio
+import hashlib
+import logging
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Depends, HTTPException, Query, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from sqlalchemy.orm import Session
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, union_all, func, cast, Text, text, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
+import orjson
 from datetime import datetime, timedelta, date
 
-from database import SessionLocal
-from models import Event, Venue
+from database import SessionScoped, engine, session_scope
+from models import Event, Venue, today_events, venues_version
+
+logger = logging.getLogger(__name__)
+
+# How often the mv_events_today materialized view is refreshed; also the
+# longest a cached /events/today response is served
+TODAY_EVENTS_REFRESH_SECONDS = 300
+# Advisory lock key held by the one worker that refreshes mv_events_today
+TODAY_EVENTS_REFRESH_LOCK = 4_170_301
 
-app = FastAPI()
+
+async def refresh_today_events():
+    """
+    Periodically refresh the mv_events_today materialized view backing
+    /events/today. Runs for the lifetime of the app.
+
+    Only one worker refreshes: it holds a session-level advisory lock on its
+    connection while it runs, and the other workers retry taking the lock
+    every TODAY_EVENTS_REFRESH_SECONDS in case it goes away.
+    """
+
+    while True:
+        try:
+            async with engine.connect() as conn:
+                locked = await conn.scalar(select(func.pg_try_advisory_lock(TODAY_EVENTS_REFRESH_LOCK)))
+                await conn.commit()
+                try:
+                    while locked:
+                        await conn.execute(text('REFRESH MATERIALIZED VIEW CONCURRENTLY mv_events_today'))
+                        await conn.commit()
+                        # This worker's cached response predates the refresh
+                        _today_cache.clear()
+                        await asyncio.sleep(TODAY_EVENTS_REFRESH_SECONDS)
+                finally:
+                    # The connection goes back to the pool, which would
+                    # otherwise keep holding the lock
+                    if locked:
+                        await conn.rollback()
+                        await conn.execute(select(func.pg_advisory_unlock(TODAY_EVENTS_REFRESH_LOCK)))
+                        await conn.commit()
+        except Exception:
+            logger.exception('Failed to refresh mv_events_today')
+        await asyncio.sleep(TODAY_EVENTS_REFRESH_SECONDS)
+
+
+@asynccontextmanager
+async def lifespan(app):
+    refresher = asyncio.create_task(refresh_today_events())
+    yield
+    refresher.cancel()
+
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow cross-origin requests from any origin (useful for frontend apps)
 app.add_middleware(
@@ -18,128 +78,340 @@ app.add_middleware(
     allow_headers=['*'],
 )
 
-def get_db():
+# Compress larger responses; GeoJSON's repeated keys compress well
+app.add_middleware(GZipMiddleware, minimum_size=1024, compresslevel=5)
+
+
+class DBSessionMiddleware:
     """
-    Dependency that provides a database session and ensures it is closed after use.
-    Yield:
-        Session: a SQLAlchemy database session
+    Give each HTTP request its own SessionScoped session, closed only after
+    the response, including a streamed body, has been sent.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        async with session_scope():
+            await self.app(scope, receive, send)
+
+
+app.add_middleware(DBSessionMiddleware)
+
+def _escape_like(value):
+    """
+    Escape LIKE wildcards in user input so it is matched literally.
+
+    Keeps a stray '%' or '_' in a search term from turning the substring
+    match into a pattern the ix_venues_name_trgm index can't narrow down.
+    """
+
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _to_naive_local(value):
+    """
+    Convert a timezone-aware datetime query parameter (e.g. a trailing 'Z'
+    from JS toISOString()) to naive server-local time, the same clock
+    date.today() uses for /events/today. events.date is a naive timestamp and
+    asyncpg can't bind aware datetimes to it. Naive values are assumed to be
+    local already and returned unchanged, as is None.
+    """
+
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone().replace(tzinfo=None)
+
+
+# (version, serialized body) of the last /venues response, where version is
+# the venues_version counter
+_venues_cache = None
+# time.monotonic() of the last venues version check
+_venues_checked_at = 0.0
+# How long a cached /venues response is served without re-checking the version
+VENUES_VERSION_TTL_SECONDS = 10
+
+# (serialized body, ETag, time.monotonic() expiry) of /events/today responses
+# keyed by day. Entries expire after TODAY_EVENTS_REFRESH_SECONDS so view
+# refreshes show up, and stop matching at midnight when the key changes.
+_today_cache = {}
+
+# Lets clients reuse a GeoJSON response for a minute, then revalidate with its ETag
+GEOJSON_CACHE_CONTROL = 'max-age=60, must-revalidate'
+
+
+async def get_db():
+    """
+    Dependency that provides the request's database session. DBSessionMiddleware
+    closes it once the response has been sent.
+    Return:
+        AsyncSession: a SQLAlchemy asyncio database session
+    """
+
+    return SessionScoped()
+
+
+def _etag_matches(request, etag):
+    """
+    Check whether the request's If-None-Match header names etag, using weak
+    comparison.
     """
 
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+    header = request.headers.get('if-none-match', '')
+    tags = {tag.strip().removeprefix('W/') for tag in header.split(',')}
+    return '*' in tags or etag.removeprefix('W/') in tags
 
 
-@app.get('/events/today', response_model=dict)
-def read_today_events(db: Session = Depends(get_db)):
+async def _events_etag(db, page):
+    """
+    Build a weak ETag for an /events page from the (id, updated_at) of its
+    rows, so it changes when a row on the page is edited, added or removed.
+    Venue updates touch their events, so those are covered too.
+
+    Args:
+        db (AsyncSession): Database session.
+        page (Select): The page query, already ordered and limited.
+
+    Returns:
+        str: The ETag header value.
+    """
+
+    result = await db.execute(page.with_only_columns(Event.id, Event.updated_at))
+    digest = hashlib.sha1()
+    for event_id, updated_at in result:
+        digest.update(f'{event_id}:{updated_at};'.encode())
+    return f'W/"{digest.hexdigest()}"'
+
+
+@app.get('/events/today')
+async def read_today_events(request: Request, db: AsyncSession = Depends(get_db)):
     """
     Retrieve events happening today. If no events are found for today,
-    fall back to events in the next three days.
+    fall back to events in the next three days. Events are read from the
+    pre-joined mv_events_today view and the result is cached in memory
+    until the view's next refresh. Responds 304 when If-None-Match matches
+    the body's ETag.
 
     Args:
-        db (Session): Database session injected via get_db dependency.
+        request (Request): The incoming request, checked for If-None-Match.
+        db (AsyncSession): Database session injected via get_db dependency.
 
     Returns:
-        dict: GeoJSON FeatureCollection of matching events.
+        Response: GeoJSON FeatureCollection of matching events.
     """
 
     today = date.today()
+    cache_key = f'events:today:{today.isoformat()}'
+    cached = _today_cache.get(cache_key)
+    if cached is not None and time.monotonic() < cached[2]:
+        body, etag, _ = cached
+        return _today_response(request, body, etag)
+
     start = datetime.combine(today, datetime.min.time())
-    end = datetime.combine(today, datetime.max.time())
-
-    # Try today's events
-    events = (
-        db.query(Event)
-        .join(Event.venue)
-        .filter(Event.date >= start, Event.date <= end)
-        .all()
+    date_col = today_events.c.date
+
+    # Today's events, or the next 3 days' when today has none, in one round-trip
+    todays = (
+        select(today_events)
+        .where(date_col >= start, date_col < start + timedelta(days=1))
+        .cte('todays')
     )
+    fallback = select(today_events).where(
+        date_col >= start,
+        date_col < start + timedelta(days=3),
+        ~select(todays.c.id).exists(),
+    )
+    result = await db.execute(union_all(select(todays), fallback))
+    events = result.all()
+
+    # Cache the serialized bytes so hits skip both the query and the encoding;
+    # earlier days' entries are dropped as they can no longer be hit. The
+    # body's hash serves as the ETag.
+    body = orjson.dumps(to_geojson(events))
+    etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+    _today_cache.clear()
+    _today_cache[cache_key] = (body, etag, time.monotonic() + TODAY_EVENTS_REFRESH_SECONDS)
+
+    return _today_response(request, body, etag)
 
-    if not events:
-        # Fallback: next 3 days
-        end = start + timedelta(days=3)
-        events = (
-            db.query(Event)
-            .join(Event.venue)
-            .filter(Event.date >= start, Event.date <= end)
-            .all()
-        )
 
-    return to_geojson(events)
+def _today_response(request, body, etag):
+    """
+    Build the /events/today response for a serialized body, or a 304 when the
+    client already has it.
+    """
+
+    headers = {'ETag': etag, 'Cache-Control': GEOJSON_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type='application/json', headers=headers)
 
 
-@app.get('/events', response_model=dict)
-def read_filtered_events(
-    db: Session = Depends(get_db),
+@app.get('/events')
+async def read_filtered_events(
+    request: Request,
+    db: AsyncSession = Depends(get_db),
     date_from: Optional[datetime] = Query(None),
     date_to: Optional[datetime] = Query(None),
     venue_name: Optional[str] = Query(None),
     limit: int = Query(10, ge=1, le=20),
-    offset: int = Query(0, ge=0)
+    after_date: Optional[datetime] = Query(None),
+    after_id: Optional[str] = Query(None)
 ):
     """
     Retrieve events filtered by optional date range and/or venue name,
-    with pagination support.
+    with keyset pagination ordered by (date, id). Responds 304 when
+    If-None-Match matches the ETag of the page's events.
 
     Args:
-        db (Session): Database session injected via get_db dependency.
+        request (Request): The incoming request, checked for If-None-Match.
+        db (AsyncSession): Database session injected via get_db dependency.
         date_from (datetime, optional): Include events on or after this date.
         date_to (datetime, optional): Include events on or before this date.
         venue_name (str, optional): Filter events by venue name (case-insensitive, substring).
         limit (int): Maximum number of events to return (1–20).
-        offset (int): Number of events to skip before collecting results.
+        after_date (datetime, optional): Date of the last event on the previous page.
+        after_id (str, optional): Id of the last event on the previous page. Must be given
+            together with after_date, otherwise a 422 is returned.
 
     Returns:
-        dict: GeoJSON FeatureCollection of matching events.
+        StreamingResponse: GeoJSON FeatureCollection of matching events, streamed as rows are read,
+            with a 'next_cursor' object ({'after_date', 'after_id'}) when the page is full
+            and null otherwise.
     """
 
-    query = db.query(Event).join(Event.venue)
+    # A cursor is the (date, id) of a row, so half of one can't be resumed from
+    if (after_date is None) != (after_id is None):
+        raise HTTPException(status_code=422, detail='after_date and after_id must be given together')
+
+    date_from = _to_naive_local(date_from)
+    date_to = _to_naive_local(date_to)
+    after_date = _to_naive_local(after_date)
+
+    # Each event's Feature is precomputed in events.feature at write time.
+    # Undated events are left out: a (NULL, id) row never compares greater
+    # than a cursor, so keyset pagination could never reach it.
+    page = (
+        select(cast(Event.feature, Text), Event.date, Event.id)
+        .where(Event.date.isnot(None))
+    )
 
     if date_from:
-        query = query.filter(Event.date >= date_from)
+        page = page.where(Event.date >= date_from)
         
     # If date_from provided but date_to omitted, default date_to to end of date_from
     if date_from and not date_to:
         date_to = datetime.combine(date_from.date(), datetime.max.time())
 
     if date_to:
-        query = query.filter(Event.date <= date_to)
+        page = page.where(Event.date <= date_to)
     
-    # Use case-insensitive match on Venue.name
+    # Use case-insensitive match on Venue.name. The matching venue ids are
+    # resolved once in an IN subquery rather than joining venues onto every
+    # event row, since only the ids are needed to filter
     if venue_name:
-        query = query.filter(Venue.name.ilike(f'%{venue_name}%'))
+        pattern = f'%{_escape_like(venue_name)}%'
+        matching_venues = select(Venue.id).where(Venue.name.ilike(pattern, escape='\\'))
+        page = page.where(Event.venue_id.in_(matching_venues))
+
+    # Seek past the previous page through the (date, id) index instead of
+    # scanning and discarding OFFSET rows
+    if after_date is not None:
+        page = page.where(tuple_(Event.date, Event.id) > tuple_(after_date, after_id))
+
+    page = page.order_by(Event.date, Event.id).limit(limit)
+
+    # Checked before streaming anything so an unchanged page costs one
+    # index seek over at most `limit` rows and no body
+    etag = await _events_etag(db, page)
+    headers = {'ETag': etag, 'Cache-Control': GEOJSON_CACHE_CONTROL}
+    if _etag_matches(request, etag):
+        return Response(status_code=304, headers=headers)
+
+    return StreamingResponse(
+        _stream_feature_collection(db, page, limit),
+        media_type='application/json',
+        headers=headers,
+    )
 
-    # Apply pagination
-    events = query.offset(offset).limit(limit).all()
 
-    return to_geojson(events)
+async def _stream_feature_collection(db, page, limit):
+    """
+    Stream a FeatureCollection for an /events page, writing each feature as
+    its row arrives from a server-side cursor instead of building the whole
+    body first.
+
+    Args:
+        db (AsyncSession): The request's database session, still open while the body streams.
+        page (Select): Query yielding (feature, date, id) rows in (date, id) order.
+        limit (int): Page size; a full page gets a next_cursor.
+
+    Yield:
+        bytes: Chunks of the FeatureCollection JSON.
+    """
+
+    result = await db.stream(page)
+
+    yield b'{"type":"FeatureCollection","features":['
+    count = 0
+    async for feature, event_date, event_id in result:
+        # features are cast to text, so they are copied through unparsed
+        yield (b',' if count else b'') + feature.encode()
+        count += 1
+
+    # A short page means there is nothing left to fetch
+    if count == limit:
+        next_cursor = orjson.dumps({'after_date': event_date, 'after_id': event_id})
+    else:
+        next_cursor = b'null'
+    yield b'],"next_cursor":' + next_cursor + b'}'
 
 
 @app.get('/venues')
-def get_venues(db: Session = Depends(get_db)):
+async def get_venues(db: AsyncSession = Depends(get_db)):
     """
     Retrieve all venues stored in the database.
 
+    The serialized list is memoized and only rebuilt when the venues_version
+    counter changes; the counter itself is checked at most every
+    VENUES_VERSION_TTL_SECONDS.
+
     Args:
-        db (Session): Database session injected via get_db dependency.
+        db (AsyncSession): Database session injected via get_db dependency.
 
     Returns:
-        list: A list of venue dicts with keys 'id', 'name', 'lat', 'lon', 'logo'.
+        Response: A JSON list of venue dicts with keys 'id', 'name', 'lat', 'lon', 'logo'.
     """
 
-    venues = db.query(Venue).all()
-    return [
-        {
-            'id': v.id,
-            'name': v.name,
-            'lat': v.lat,
-            'lon': v.lon,
-            'logo': v.logo
-        }
-        for v in venues
-    ]
+    global _venues_cache, _venues_checked_at
+
+    now = time.monotonic()
+    if _venues_cache is not None and now - _venues_checked_at < VENUES_VERSION_TTL_SECONDS:
+        return Response(content=_venues_cache[1], media_type='application/json')
+
+    # Read before the venues so the cached list is never older than its version
+    version = await db.scalar(select(venues_version.c.version))
+    _venues_checked_at = now
+
+    if _venues_cache is None or _venues_cache[0] != version:
+        result = await db.execute(select(Venue.id, Venue.name, Venue.lat, Venue.lon, Venue.logo))
+        venues = [
+            {
+                'id': v.id,
+                'name': v.name,
+                'lat': v.lat,
+                'lon': v.lon,
+                'logo': v.logo
+            }
+            for v in result
+        ]
+        _venues_cache = (version, orjson.dumps(venues))
+
+    return Response(content=_venues_cache[1], media_type='application/json')
 
 @app.get('/ping')
 def ping():
@@ -152,45 +424,52 @@ def ping():
 
     return {'status': 'ok'}
 
+def _feature(e):
+    """
+    Build the GeoJSON Feature for a single mv_events_today row.
+
+    Args:
+        e (Row): A row of the mv_events_today view.
+
+    Returns:
+        dict: GeoJSON Feature with a Point geometry at the venue.
+    """
+
+    return {
+        'type': 'Feature',
+        'geometry': {
+            'type': 'Point',
+            'coordinates': (e.lon, e.lat)
+        },
+        'properties': {
+            'id': e.id,
+            'show_name': e.show_name,
+            'date': e.date,
+            'link': e.link,
+            'img': e.img,
+            'venue': {
+                'id': e.venue_id,
+                'name': e.venue_name,
+                'logo': e.logo
+            }
+        }
+    }
+
+
 def to_geojson(events):
     """
-    Convert a list of Event ORM objects into a GeoJSON FeatureCollection.
+    Convert mv_events_today rows into a GeoJSON FeatureCollection.
 
-    Only include events whose associated venue has latitude and longitude.
+    Venue coordinates are NOT NULL in the schema, so every row has a point.
 
     Args:
-        events (list[Event]): List of Event ORM instances.
+        events (list[Row]): Rows of the mv_events_today view.
 
     Returns:
         dict: GeoJSON FeatureCollection with event features.
     """
 
-    geojson = {
+    return {
         'type': 'FeatureCollection',
-        'features': []
+        'features': [_feature(e) for e in events]
     }
-
-    for e in events:
-        # Only include events where venue coordinates are present
-        if e.venue and e.venue.lat is not None and e.venue.lon is not None:
-            geojson['features'].append({
-                'type': 'Feature',
-                'geometry': {
-                    'type': 'Point',
-                    'coordinates': [e.venue.lon, e.venue.lat]
-                },
-                'properties': {
-                    'id': e.id,
-                    'show_name': e.show_name,
-                    'date': e.date.isoformat() if e.date else None,
-                    'link': e.link,
-                    'img': e.img,
-                    'venue': {
-                        'id': e.venue.id,
-                        'name': e.venue.name,
-                        'logo': e.venue.logo
-                    }
-                }
-            })
-
-    return geojson
@@ -0,0 +1,14 @@
+-- Indexes behind the /events date range and venue name filters.
+--
+-- Migrations in this directory are idempotent and are applied in file order,
+-- both to existing databases and after Base.metadata.create_all():
+--     psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/<file>.sql
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- Covers the date range filters together with the join to venues; date-only
+-- lookups use its leading column
+CREATE INDEX IF NOT EXISTS ix_events_date_venue ON events (date, venue_id);
+
+-- Lets the case-insensitive substring match on name use an index
+CREATE INDEX IF NOT EXISTS ix_venues_name_trgm ON venues USING gin (name gin_trgm_ops);
@@ -0,0 +1,3 @@
+-- Index for keyset pagination on /events, which seeks on (date, id).
+
+CREATE INDEX IF NOT EXISTS ix_events_date_id ON events (date, id);
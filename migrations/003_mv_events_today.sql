@@ -0,0 +1,20 @@
+-- Pre-joined events backing /events/today, refreshed by the app every few
+-- minutes with REFRESH MATERIALIZED VIEW CONCURRENTLY.
+--
+-- The window runs from the start of yesterday to four days past the start of
+-- tomorrow, in the database's clock. That is a day wider on each side than
+-- the endpoint's today-plus-three-days fallback, which is computed with the
+-- app's clock. It still covers the fallback when the two timezones differ by
+-- up to a day, or when the view was last refreshed before midnight.
+
+CREATE MATERIALIZED VIEW IF NOT EXISTS mv_events_today AS
+SELECT e.id, e.show_name, e.date, e.link, e.img,
+       v.id AS venue_id, v.name AS venue_name, v.lat, v.lon, v.logo
+FROM events e
+JOIN venues v ON e.venue_id = v.id
+WHERE e.date >= date_trunc('day', localtimestamp) - interval '1 day'
+  AND e.date < date_trunc('day', localtimestamp) + interval '5 day';
+
+-- REFRESH ... CONCURRENTLY requires a unique index on the view
+CREATE UNIQUE INDEX IF NOT EXISTS ix_mv_events_today_id ON mv_events_today (id);
+CREATE INDEX IF NOT EXISTS ix_mv_events_today_date ON mv_events_today (date);
@@ -0,0 +1,57 @@
+-- Precomputed GeoJSON Feature per event, read by /events.
+--
+-- events_feature fills events.feature on every insert/update from the event
+-- and its venue; venues_event_features re-touches a venue's events when the
+-- venue changes so their features follow.
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS feature jsonb;
+
+CREATE OR REPLACE FUNCTION events_set_feature() RETURNS trigger AS $$
+BEGIN
+    SELECT jsonb_build_object(
+        'type', 'Feature',
+        'geometry', jsonb_build_object(
+            'type', 'Point',
+            'coordinates', jsonb_build_array(v.lon, v.lat)
+        ),
+        'properties', jsonb_build_object(
+            'id', NEW.id,
+            'show_name', NEW.show_name,
+            'date', NEW.date,
+            'link', NEW.link,
+            'img', NEW.img,
+            'venue', jsonb_build_object('id', v.id, 'name', v.name, 'logo', v.logo)
+        )
+    )
+    INTO NEW.feature
+    FROM venues v
+    WHERE v.id = NEW.venue_id;
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS events_feature ON events;
+CREATE TRIGGER events_feature
+BEFORE INSERT OR UPDATE ON events
+FOR EACH ROW EXECUTE FUNCTION events_set_feature();
+
+-- The no-op update fires events_feature for each of the venue's events. Only
+-- the columns that go into a feature are compared, so updates that touch
+-- nothing else don't rewrite every event.
+CREATE OR REPLACE FUNCTION venues_refresh_event_features() RETURNS trigger AS $$
+BEGIN
+    UPDATE events SET venue_id = venue_id WHERE venue_id = NEW.id;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS venues_event_features ON venues;
+CREATE TRIGGER venues_event_features
+AFTER UPDATE ON venues
+FOR EACH ROW WHEN (
+    (OLD.name, OLD.lat, OLD.lon, OLD.logo) IS DISTINCT FROM (NEW.name, NEW.lat, NEW.lon, NEW.logo)
+)
+EXECUTE FUNCTION venues_refresh_event_features();
+
+-- Backfill events written before the trigger existed
+UPDATE events SET venue_id = venue_id WHERE feature IS NULL;
@@ -0,0 +1,30 @@
+-- Single-row counter bumped by every statement that writes venues; /venues
+-- re-serializes its cached response when the value changes.
+--
+-- The bump takes the row lock on venues_version, so overlapping writers
+-- increment it one after another in commit order. A later check can't see a
+-- version that was already current before another writer's commit, as could
+-- happen with a timestamp or sequence.
+
+CREATE TABLE IF NOT EXISTS venues_version (
+    id boolean PRIMARY KEY DEFAULT true CHECK (id),
+    version bigint NOT NULL
+);
+INSERT INTO venues_version (version) VALUES (0) ON CONFLICT (id) DO NOTHING;
+
+CREATE OR REPLACE FUNCTION bump_venues_version() RETURNS trigger AS $$
+BEGIN
+    UPDATE venues_version SET version = version + 1;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS venues_version_bump ON venues;
+CREATE TRIGGER venues_version_bump
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON venues
+FOR EACH STATEMENT EXECUTE FUNCTION bump_venues_version();
+
+-- Replaced by the counter: the timestamp column an earlier revision of this
+-- migration added to venues
+DROP TRIGGER IF EXISTS venues_updated_at ON venues;
+ALTER TABLE venues DROP COLUMN IF EXISTS updated_at;
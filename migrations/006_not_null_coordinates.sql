@@ -0,0 +1,17 @@
+-- Every event has a venue and every venue has coordinates, so every event
+-- gets a GeoJSON point; to_geojson and events_set_feature rely on this.
+--
+-- SET NOT NULL fails, and the transaction rolls back, while violating rows
+-- remain. Find them with:
+--     SELECT id FROM venues WHERE lat IS NULL OR lon IS NULL;
+--     SELECT id FROM events WHERE venue_id IS NULL OR feature IS NULL;
+
+BEGIN;
+
+ALTER TABLE venues ALTER COLUMN lat SET NOT NULL;
+ALTER TABLE venues ALTER COLUMN lon SET NOT NULL;
+ALTER TABLE events ALTER COLUMN venue_id SET NOT NULL;
+-- Filled by the events_feature BEFORE trigger, which runs before the check
+ALTER TABLE events ALTER COLUMN feature SET NOT NULL;
+
+COMMIT;
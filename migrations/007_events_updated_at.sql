@@ -0,0 +1,17 @@
+-- events.updated_at, bumped on every update, including the no-op updates
+-- venues_event_features makes when a venue changes; /events derives its
+-- ETag from it.
+
+ALTER TABLE events ADD COLUMN IF NOT EXISTS updated_at timestamp NOT NULL DEFAULT now();
+
+CREATE OR REPLACE FUNCTION set_updated_at() RETURNS trigger AS $$
+BEGIN
+    NEW.updated_at := now();
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS events_updated_at ON events;
+CREATE TRIGGER events_updated_at
+BEFORE UPDATE ON events
+FOR EACH ROW EXECUTE FUNCTION set_updated_at();
@@ -1,26 +1,81 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey
+from sqlalchemy import Column, Integer, BigInteger, Boolean, String, DateTime, Float, ForeignKey, Index, DDL, MetaData, Table, event, func
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from database import Base
 
+# Trigram operator classes used by the venue name search index
+event.listen(Base.metadata, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+
 class Venue(Base):
     __tablename__ = "venues"
+    __table_args__ = (
+        # Lets the case-insensitive substring match on name use an index
+        Index(
+            "ix_venues_name_trgm",
+            "name",
+            postgresql_using="gin",
+            postgresql_ops={"name": "gin_trgm_ops"},
+        ),
+    )
 
     id = Column(Integer, primary_key=True)
     name = Column(String, index=True)
-    lat = Column(Float)
-    lon = Column(Float)
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
     logo = Column(String)
 
     events = relationship("Event", back_populates="venue")
 
 class Event(Base):
     __tablename__ = "events"
+    __table_args__ = (
+        # Covers the date range filters together with the join to venues;
+        # date-only lookups use its leading column
+        Index("ix_events_date_venue", "date", "venue_id"),
+        # Keyset pagination seeks on (date, id)
+        Index("ix_events_date_id", "date", "id"),
+    )
 
     id = Column(String, primary_key=True)
     show_name = Column(String)
     date = Column(DateTime)
     link = Column(String)
     img = Column(String)
-    venue_id = Column(Integer, ForeignKey("venues.id"))
+    venue_id = Column(Integer, ForeignKey("venues.id"), nullable=False)
+    # GeoJSON Feature for the event, maintained by the triggers in
+    # migrations/004_events_feature.sql
+    feature = Column(JSONB, nullable=False)
+    # Bumped by the events_updated_at trigger in migrations/007_events_updated_at.sql,
+    # including when the venue changes; the /events ETag is derived from it
+    updated_at = Column(DateTime, nullable=False, server_default=func.now())
 
     venue = relationship("Venue", back_populates="events")
+
+# Single-row counter bumped by every statement that writes venues; /venues
+# uses it to tell when its cached response is stale. Created, seeded and
+# maintained by migrations/005_venues_version.sql, so it is kept off Base's
+# MetaData like the view below.
+venues_version = Table(
+    "venues_version",
+    MetaData(),
+    Column("id", Boolean, primary_key=True),
+    Column("version", BigInteger, nullable=False),
+)
+
+# Columns of the mv_events_today materialized view backing /events/today. The
+# view itself is created by migrations/003_mv_events_today.sql; it is kept on
+# its own MetaData so create_all doesn't try to create it as a table.
+today_events = Table(
+    "mv_events_today",
+    MetaData(),
+    Column("id", String, primary_key=True),
+    Column("show_name", String),
+    Column("date", DateTime),
+    Column("link", String),
+    Column("img", String),
+    Column("venue_id", Integer),
+    Column("venue_name", String),
+    Column("lat", Float),
+    Column("lon", Float),
+    Column("logo", String),
+)